@@ -0,0 +1,376 @@
+"""
+取り込み処理のベンチマーク
+
+    python benchmarks/bench.py --output result.json
+    python benchmarks/bench.py --compare result.json  # 前回の結果と比較する
+
+実機がなくてもmock(TUSBADMHMockImpl)で動かせる。--backend module:Class で
+TUSBADMHを実装した別のバックエンドも計測できる。
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import datetime
+import importlib
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+# インストール済みのものではなく、このリポジトリのtusbadmhを計測する
+sys.path.insert(0, str(ROOT))
+
+from tusbadmh import TUSBADMH, Ch, ClkSel, Mode, OvfSt, TrgSel  # noqa: E402
+
+BUFFER_SIZE = 1048576
+CHUNK_SIZES = [1024, 8192, 65536, 262144, 1048576]
+ID = 0
+
+# 値が大きいほど良い指標。それ以外は小さいほど良い
+HIGHER_IS_BETTER = ("samples_per_s",)
+
+
+def load_backend(spec: str, args: List[str]) -> TUSBADMH:
+    """
+    "module:Class"形式の指定からバックエンドを生成します。argsは"key=value"のリストです。
+    """
+    module_name, class_name = spec.split(":")
+    cls = getattr(importlib.import_module(module_name), class_name)
+    kwargs = dict(arg.split("=", 1) for arg in args)
+    return cls(**kwargs)
+
+
+def setup(tusbadmh: TUSBADMH) -> None:
+    err = tusbadmh.device_open(id=ID)
+    if err.has_error():
+        raise Exception(f"could not open device: {err.message()}")
+    err = tusbadmh.clock_select(id=ID, clk_sel=ClkSel.IN_200MHz, div=7, ave=0)
+    if err.has_error():
+        raise Exception(f"could not select clock: {err.message()}")
+
+
+def start_adc(tusbadmh: TUSBADMH, mode: Mode, cyc_len: int) -> None:
+    """
+    ソフトウェアトリガで取り込みを開始します。
+    """
+    err = tusbadmh.adc_start(
+        id=ID,
+        cyc_len=cyc_len,
+        pre_len=0,
+        trg_sel=TrgSel.SOFTWARE,
+        mode=mode,
+        ch1_only=False,
+    )
+    if err.has_error():
+        raise Exception(f"could not start adc: {err.message()}")
+    err = tusbadmh.trigger(id=ID)
+    if err.has_error():
+        raise Exception(f"could not trigger: {err.message()}")
+
+
+def fill(tusbadmh: TUSBADMH, leng: int) -> None:
+    """
+    ソフトウェアトリガの繰り返しモードでleng個のデータを取り込ませます。
+    """
+    start_adc(tusbadmh, Mode.REPEAT, leng)
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline:
+        res, _ = tusbadmh.length(id=ID)
+        if res.len_1 >= leng:
+            return
+        time.sleep(0.001)
+    raise Exception(f"timed out while waiting for {leng} samples")
+
+
+def drain(tusbadmh: TUSBADMH, leng: int, chunk: int) -> int:
+    total = 0
+    while total < leng:
+        res, err = tusbadmh.data_get(id=ID, ch=Ch.CHANNEL_1, leng=chunk)
+        if err.has_error() or res.leng == 0:
+            break
+        total += res.leng
+    for ch in Ch:
+        # 計測しないチャンネルのデータも捨てておく
+        while tusbadmh.data_get(id=ID, ch=ch, leng=BUFFER_SIZE)[0].leng > 0:
+            pass
+    tusbadmh.adc_stop(id=ID)
+    return total
+
+
+def bench_drain(tusbadmh: TUSBADMH, repeat: int) -> Dict[str, float]:
+    """
+    あらかじめ溜めておいた1048576サンプルを、チャンクサイズごとにdata_getで取り出す速さを計測します。
+    取り込み自体の速さは含まれません(それはbench_continuousで計測する)。
+    """
+    results = {}
+    for chunk in CHUNK_SIZES:
+        rates = []
+        for _ in range(repeat):
+            fill(tusbadmh, BUFFER_SIZE)
+            start = time.perf_counter()
+            total = drain(tusbadmh, BUFFER_SIZE, chunk)
+            rates.append(total / (time.perf_counter() - start))
+        results[f"drain.chunk_{chunk}.samples_per_s"] = statistics.median(rates)
+    return results
+
+
+def bench_continuous(tusbadmh: TUSBADMH, duration: float) -> Dict[str, float]:
+    """
+    連続モードで取り込みながらチャンクサイズごとにduration秒間取り出し続け、Ch1で実際に受け取れた
+    サンプル数/秒とオーバーフローの回数を計測します。オーバーフローしたら取り込みを再開します。
+    """
+    results: Dict[str, float] = {}
+    for chunk in CHUNK_SIZES:
+        overflows = 0
+        total = 0
+        start_adc(tusbadmh, Mode.CONTINUATION, 0)
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            res, err = tusbadmh.length(id=ID)
+            if err.has_error():
+                raise Exception(f"could not get length: {err.message()}")
+            for ch, leng in ((Ch.CHANNEL_1, res.len_1), (Ch.CHANNEL_2, res.len_2)):
+                if leng <= 0:
+                    continue
+                data, _ = tusbadmh.data_get(id=ID, ch=ch, leng=min(leng, chunk))
+                if ch == Ch.CHANNEL_1:
+                    total += data.leng
+            status, _ = tusbadmh.status_get(id=ID)
+            if status.ovf_st != OvfSt.OK:
+                overflows += 1
+                tusbadmh.adc_stop(id=ID)
+                start_adc(tusbadmh, Mode.CONTINUATION, 0)
+        elapsed = time.perf_counter() - start
+        drain(tusbadmh, 0, BUFFER_SIZE)
+        results[f"continuous.chunk_{chunk}.samples_per_s"] = total / elapsed
+        results[f"continuous.chunk_{chunk}.overflows"] = overflows
+    return results
+
+
+def _time_calls(f: Callable[[], Any], n: int) -> List[float]:
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        f()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _latency(name: str, f: Callable[[], Any], n: int) -> Dict[str, float]:
+    return _summarize(name, _time_calls(f, n))
+
+
+def _summarize(name: str, samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        f"latency.{name}.mean_us": statistics.fmean(samples),
+        f"latency.{name}.p50_us": samples[len(samples) // 2],
+        f"latency.{name}.p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def bench_latency(tusbadmh: TUSBADMH, n: int) -> Dict[str, float]:
+    results = {}
+    results.update(_latency("length", lambda: tusbadmh.length(id=ID), n))
+    results.update(_latency("status_get", lambda: tusbadmh.status_get(id=ID), n))
+    # 1回あたり1024サンプル取り出す場合。空のバッファを計測しないように、
+    # バッファに入る分(1024回)ずつ溜め直しながら計測する
+    def data_get_1024() -> None:
+        res, err = tusbadmh.data_get(id=ID, ch=Ch.CHANNEL_1, leng=1024)
+        if err.has_error() or res.leng != 1024:
+            raise Exception(f"data_get returned {res.leng} samples instead of 1024")
+
+    samples: List[float] = []
+    while len(samples) < n:
+        calls = min(n - len(samples), BUFFER_SIZE // 1024)
+        fill(tusbadmh, calls * 1024)
+        samples += _time_calls(data_get_1024, calls)
+        drain(tusbadmh, 0, BUFFER_SIZE)
+    results.update(_summarize("data_get_1024", samples))
+    return results
+
+
+def _max_rss() -> Optional[int]:
+    # ru_maxrssはexec前の親プロセスの値を引き継ぐことがあるので、Linuxでは/procの値を使う
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windowsではresourceが使えない
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、それ以外はキロバイト単位
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def bench_memory_child(tusbadmh: TUSBADMH) -> Dict[str, Optional[int]]:
+    # 最大RSSはプロセス全体の値なので、他の計測と分けて子プロセスで計測する
+    before = _max_rss()
+    fill(tusbadmh, BUFFER_SIZE)
+    drain(tusbadmh, BUFFER_SIZE, BUFFER_SIZE)
+    after = _max_rss()
+    return {
+        f"memory.drain_{BUFFER_SIZE}.peak_rss_bytes": after,
+        f"memory.drain_{BUFFER_SIZE}.rss_growth_bytes": (
+            None if before is None or after is None else after - before
+        ),
+    }
+
+
+def bench_memory(backend: str, backend_args: List[str]) -> Dict[str, Optional[int]]:
+    cmd = [sys.executable, __file__, "--memory-child", "--backend", backend]
+    for arg in backend_args:
+        cmd += ["--backend-arg", arg]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def bench_import(repeat: int) -> Dict[str, float]:
+    results = {}
+    for name, stmt in (
+        ("tusbadmh", "import tusbadmh"),
+        ("mock", "from tusbadmh import TUSBADMHMockImpl"),
+    ):
+        code = (
+            "import sys, time\n"
+            f"sys.path.insert(0, {str(ROOT)!r})\n"
+            "start = time.perf_counter()\n"
+            f"{stmt}\n"
+            "print(time.perf_counter() - start)\n"
+        )
+        times = [
+            float(
+                subprocess.run(
+                    [sys.executable, "-c", code], check=True, capture_output=True, text=True
+                ).stdout
+            )
+            for _ in range(repeat)
+        ]
+        results[f"import.{name}.median_s"] = statistics.median(times)
+    return results
+
+
+def revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> bool:
+    """
+    2つの結果を比較して表示します。threshold以上悪化した指標があればFalseを返します。
+    前回の値が0の指標は比率を計算できないので、小さいほど良い指標が少しでも増えたら悪化とみなします。
+    片方の結果にしかない指標も表示しますが、判定には使いません。
+    """
+    ok = True
+    print(f"{'metric':<48} {'old':>14} {'new':>14} {'change':>8}")
+    keys = list(old["results"])
+    keys += [key for key in new["results"] if key not in old["results"]]
+    for key in keys:
+        old_value = old["results"].get(key)
+        new_value = new["results"].get(key)
+        if old_value is None or new_value is None:
+            old_text = "-" if old_value is None else f"{old_value:.4g}"
+            new_text = "-" if new_value is None else f"{new_value:.4g}"
+            print(f"{key:<48} {old_text:>14} {new_text:>14} {'n/a':>8}")
+            continue
+        higher_is_better = key.endswith(HIGHER_IS_BETTER)
+        if old_value == 0:
+            change_text = "+0.0%" if new_value == 0 else "n/a"
+            worse = new_value < 0 if higher_is_better else new_value > 0
+        else:
+            change = new_value / old_value - 1
+            change_text = f"{change:+.1%}"
+            worse = (-change if higher_is_better else change) > threshold
+        mark = ""
+        if worse:
+            mark = " !"
+            ok = False
+        print(f"{key:<48} {old_value:>14.4g} {new_value:>14.4g} {change_text:>8}{mark}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="tusbadmh benchmarks")
+    parser.add_argument(
+        "--backend",
+        default="tusbadmh:TUSBADMHMockImpl",
+        help="module:Class of the TUSBADMH backend to measure",
+    )
+    parser.add_argument(
+        "--backend-arg",
+        action="append",
+        default=[],
+        help="key=value passed to the backend constructor (repeatable)",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency-calls", type=int, default=1000)
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=0.5,
+        help="seconds of continuous acquisition per chunk size (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON from a previous run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fail --compare when a metric gets worse by more than this ratio",
+    )
+    parser.add_argument("--memory-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    tusbadmh = load_backend(args.backend, args.backend_arg)
+    setup(tusbadmh)
+    if args.memory_child:
+        print(json.dumps(bench_memory_child(tusbadmh)))
+        return
+
+    results: Dict[str, Any] = {}
+    results.update(bench_drain(tusbadmh, args.repeat))
+    results.update(bench_continuous(tusbadmh, args.duration))
+    results.update(bench_latency(tusbadmh, args.latency_calls))
+    tusbadmh.device_close(id=ID)
+    results.update(bench_memory(args.backend, args.backend_arg))
+    results.update(bench_import(args.repeat))
+
+    report = {
+        "revision": revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    if args.compare is not None:
+        old = json.loads(args.compare.read_text())
+        if not compare(old, report, args.threshold):
+            sys.exit(1)
+    elif args.output is None:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,9 @@ setup(
     name="tusbadmh",
     version="0.1",
     packages=find_packages(),
-    package_data={"tusbadmh": ["*.csv"]},
+    package_data={"tusbadmh": ["*.bin"]},
+    install_requires=["numpy"],
+    entry_points={
+        "console_scripts": ["tusbadmh-capture=tusbadmh.cli:main"],
+    },
 )
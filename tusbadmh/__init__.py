@@ -1,5 +1,61 @@
-from tusbadmh.tusbadmh import *
-from tusbadmh.tusbadmh_impl import *
-from tusbadmh.tusbadmh_mock_impl import *
-from tusbadmh.enum import *
+# import tusbadmh を軽くするため、サブモジュールは属性に初めてアクセスしたときに読み込む
+import importlib
+from typing import Any
 
+_attrs: dict[str, str] = {
+    "TUSBADMH": "tusbadmh.tusbadmh",
+    "TUSBADMHImpl": "tusbadmh.tusbadmh_impl",
+    "TUSBADMHMockImpl": "tusbadmh.tusbadmh_mock_impl",
+    "TUSBADMHServer": "tusbadmh.server",
+    "TUSBADMHClient": "tusbadmh.server",
+    "OverflowWatchdog": "tusbadmh.watchdog",
+    "SignalSource": "tusbadmh.signal_source",
+    "ReplaySource": "tusbadmh.signal_source",
+    "SineSource": "tusbadmh.signal_source",
+    "SquareSource": "tusbadmh.signal_source",
+    "StepSource": "tusbadmh.signal_source",
+    "ChirpSource": "tusbadmh.signal_source",
+    "NoiseSource": "tusbadmh.signal_source",
+    "PulseTrainSource": "tusbadmh.signal_source",
+    "TrgSel": "tusbadmh.enum",
+    "Mode": "tusbadmh.enum",
+    "Ch": "tusbadmh.enum",
+    "ClkSel": "tusbadmh.enum",
+    "InputType": "tusbadmh.enum",
+    "Status": "tusbadmh.enum",
+    "OvfSt": "tusbadmh.enum",
+    "Error": "tusbadmh.error",
+    "StatusResult": "tusbadmh.result_class",
+    "LengthResult": "tusbadmh.result_class",
+    "CheckInputTypeResult": "tusbadmh.result_class",
+    "DataResult": "tusbadmh.result_class",
+}
+
+_submodules = {
+    "enum",
+    "error",
+    "result_class",
+    "server",
+    "signal_source",
+    "tusbadmh",
+    "tusbadmh_impl",
+    "tusbadmh_mock_impl",
+    "watchdog",
+}
+
+__all__ = list(_attrs)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _attrs:
+        value = getattr(importlib.import_module(_attrs[name]), name)
+    elif name in _submodules:
+        value = importlib.import_module(f"tusbadmh.{name}")
+    else:
+        raise AttributeError(f"module 'tusbadmh' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_attrs) | _submodules)
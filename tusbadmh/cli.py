@@ -0,0 +1,297 @@
+from array import array
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+import argparse
+import sys
+import time
+
+from tusbadmh.tusbadmh import TUSBADMH
+from tusbadmh.enum import (
+    ClkSel,
+    InputType,
+    Mode,
+    Status,
+    TrgSel,
+)
+from tusbadmh.error import Error
+from tusbadmh.watchdog import OverflowWatchdog
+
+
+def _write(f: BinaryIO, data: List[int]) -> None:
+    # 変換値はuint16、リトルエンディアンで書き出す
+    samples = array("H", data)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    f.write(samples.tobytes())
+
+
+def _check(err: Error, what: str) -> None:
+    if err.has_error():
+        sys.exit(f"tusbadmh-capture: could not {what}: {err.message()}")
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="tusbadmh-capture",
+        description="Capture data from TUSB-0216ADMH into raw little-endian uint16 files.",
+    )
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument(
+        "--dll",
+        default="./DRIVER/amd64/TUSBADMH.dll",
+        help="path to TUSBADMH.dll (default: %(default)s)",
+    )
+    backend.add_argument("--mock", action="store_true", help="use TUSBADMHMockImpl")
+    parser.add_argument("--id", type=int, default=0, help="unit number (0-15)")
+    parser.add_argument(
+        "--clock",
+        choices=[c.name for c in ClkSel if c != ClkSel.EX],
+        default=ClkSel.IN_200MHz.name,
+        help="clock source (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--div",
+        type=int,
+        default=199,
+        help="clock divider; the sampling clock is clock / (div + 1) (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ave", type=int, default=0, help="average 2**ave samples (default: %(default)s)"
+    )
+    parser.add_argument(
+        "--input-type",
+        choices=[t.name for t in InputType],
+        default=InputType.BIPOLAR.name,
+        help="input range of both channels (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--trigger",
+        choices=[t.name for t in TrgSel],
+        default=TrgSel.SOFTWARE.name,
+        help="trigger source (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--th-level", type=int, default=32768, help="analog trigger level (1-65534)"
+    )
+    parser.add_argument(
+        "--n-level", type=int, default=800, help="analog trigger noise level (0-3277)"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=[m.name for m in Mode],
+        default=Mode.CONTINUATION.name,
+        help="acquisition mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cyc-len",
+        type=int,
+        default=1048576,
+        help="samples per trigger in REPEAT mode (default: %(default)s)",
+    )
+    parser.add_argument("--pre-len", type=int, default=0, help="pre-trigger length")
+    parser.add_argument(
+        "--length",
+        type=int,
+        default=0,
+        help="samples to capture per channel; 0 captures until Ctrl-C (default: %(default)s)",
+    )
+    parser.add_argument("--ch1-only", action="store_true", help="capture ch1 only")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        required=True,
+        help="ch1 output file; ch2 goes to <stem>_ch2<suffix> unless --output-2 is given",
+    )
+    parser.add_argument("--output-2", type=Path, help="ch2 output file")
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=1.0,
+        help="seconds between progress lines (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    _validate(parser, args)
+    return args
+
+
+def _validate(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    # 範囲はTUSBADMHの各メソッドの説明に従う
+    ranges = [
+        ("--id", args.id, 0, 15),
+        ("--div", args.div, 0, 199),
+        ("--ave", args.ave, 0, 8),
+        ("--th-level", args.th_level, 1, 65534),
+        ("--n-level", args.n_level, 0, 3277),
+        ("--cyc-len", args.cyc_len, 1, 1048576),
+        ("--pre-len", args.pre_len, 0, 1048576),
+    ]
+    for name, value, low, high in ranges:
+        if not low <= value <= high:
+            parser.error(f"{name} must be between {low} and {high}: {value}")
+    if args.length < 0:
+        parser.error(f"--length must not be negative: {args.length}")
+    if args.report_interval <= 0:
+        parser.error(f"--report-interval must be positive: {args.report_interval}")
+    clock = ClkSel[args.clock].freq() / (args.div + 1)
+    if not 1e6 <= clock <= 25e6:
+        parser.error(
+            f"the internal clock must be between 1MHz and 25MHz: {args.clock} / "
+            f"({args.div} + 1) = {clock / 1e6:g}MHz"
+        )
+    if args.mock and args.trigger != TrgSel.SOFTWARE.name:
+        # TUSBADMHMockImplはソフトウェアトリガしか実装していないので、トリガ待ちのまま終わらない
+        parser.error(f"--mock supports only --trigger {TrgSel.SOFTWARE.name}")
+
+
+def _open_backend(args: argparse.Namespace) -> TUSBADMH:
+    if args.mock:
+        from tusbadmh.tusbadmh_mock_impl import TUSBADMHMockImpl
+
+        return TUSBADMHMockImpl()
+    from tusbadmh.tusbadmh_impl import TUSBADMHImpl
+
+    return TUSBADMHImpl(dll_path=args.dll)
+
+
+def _report(
+    watchdog: OverflowWatchdog, received: int, samples_per_s: float, end: str
+) -> None:
+    print(
+        f"\r{received} samples  {samples_per_s:,.0f} samples/s  "
+        f"buffer {watchdog.rate:3d}%  dropped {watchdog.dropped} "
+        f"({watchdog.restarts} restarts)",
+        end=end,
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    clk_sel = ClkSel[args.clock]
+    trg_sel = TrgSel[args.trigger]
+    mode = Mode[args.mode]
+    input_type = InputType[args.input_type]
+    output_2 = args.output_2
+    if output_2 is None:
+        output_2 = args.output.with_name(f"{args.output.stem}_ch2{args.output.suffix}")
+
+    tusbadmh = _open_backend(args)
+    _check(tusbadmh.device_open(id=args.id), "open device")
+    try:
+        _check(
+            tusbadmh.clock_select(
+                id=args.id, clk_sel=clk_sel, div=args.div, ave=args.ave
+            ),
+            "select clock",
+        )
+        _check(
+            tusbadmh.input_type(id=args.id, type_1=input_type, type_2=input_type),
+            "set input type",
+        )
+        if trg_sel in (TrgSel.UP_EDGE, TrgSel.DOWN_EDGE):
+            _check(
+                tusbadmh.thlevel_set(
+                    id=args.id, th_level=args.th_level, n_level=args.n_level
+                ),
+                "set trigger level",
+            )
+        fs = clk_sel.freq() / (args.div + 1) / 2**args.ave
+        watchdog = OverflowWatchdog(
+            tusbadmh,
+            id=args.id,
+            fs=fs,
+            cyc_len=args.cyc_len,
+            pre_len=args.pre_len,
+            trg_sel=trg_sel,
+            mode=mode,
+            ch1_only=args.ch1_only,
+        )
+        _capture(args, tusbadmh, watchdog, output_2)
+    finally:
+        tusbadmh.device_close(id=args.id)
+
+
+def _capture(
+    args: argparse.Namespace,
+    tusbadmh: TUSBADMH,
+    watchdog: OverflowWatchdog,
+    output_2: Path,
+) -> None:
+    f_1: Optional[BinaryIO] = None
+    f_2: Optional[BinaryIO] = None
+    received_1 = 0
+    received_2 = 0
+    start = time.perf_counter()
+    last_time, last_received = start, 0
+
+    def done() -> bool:
+        if args.length <= 0:
+            return False
+        return received_1 >= args.length and (
+            args.ch1_only or received_2 >= args.length
+        )
+
+    try:
+        f_1 = open(args.output, "wb", buffering=1 << 20)
+        if not args.ch1_only:
+            f_2 = open(output_2, "wb", buffering=1 << 20)
+        _check(watchdog.start(), "start adc")
+        while not done():
+            data_1, data_2, err = watchdog.poll()
+            _check(err, "read data")
+            if args.length > 0:
+                data_1 = data_1[: args.length - received_1]
+                data_2 = data_2[: args.length - received_2]
+            _write(f_1, data_1)
+            received_1 += len(data_1)
+            if f_2 is not None:
+                _write(f_2, data_2)
+                received_2 += len(data_2)
+            if (
+                len(data_1) == 0
+                and len(data_2) == 0
+                and watchdog.mode == Mode.REPEAT
+                and watchdog.trg_sel == TrgSel.SOFTWARE
+            ):
+                _retrigger(tusbadmh, args.id)
+            now = time.perf_counter()
+            if now - last_time >= args.report_interval:
+                _report(
+                    watchdog,
+                    received_1,
+                    (received_1 - last_received) / (now - last_time),
+                    "",
+                )
+                last_time, last_received = now, received_1
+            if watchdog.interval > 0:
+                time.sleep(watchdog.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watchdog.stop()
+        if f_1 is not None:
+            f_1.close()
+        if f_2 is not None:
+            f_2.close()
+    elapsed = time.perf_counter() - start
+    _report(watchdog, received_1, received_1 / elapsed if elapsed > 0 else 0.0, "\n")
+
+
+def _retrigger(tusbadmh: TUSBADMH, id: int) -> None:
+    # 繰り返しモードでは1回のトリガでcyc_len個しか取り込まない
+    # 変換中に再度トリガしないよう、サイクルが終わってPC内のバッファも空になってからトリガする
+    status, err = tusbadmh.status_get(id=id)
+    _check(err, "get status")
+    if status.status not in (Status.WAITING, Status.STOP):
+        return
+    res, err = tusbadmh.length(id=id)
+    _check(err, "get length")
+    if res.len_1 > 0 or res.len_2 > 0:
+        return
+    _check(tusbadmh.trigger(id=id), "trigger")
+
+
+if __name__ == "__main__":
+    main()
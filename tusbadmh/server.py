@@ -0,0 +1,755 @@
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Union, cast
+import os
+import queue
+import socket
+import stat
+import struct
+import sys
+import threading
+import time
+
+from tusbadmh.error import Error
+from tusbadmh.tusbadmh import TUSBADMH
+from tusbadmh.enum import (
+    Ch,
+    ClkSel,
+    InputType,
+    Mode,
+    OvfSt,
+    Status,
+    TrgSel,
+)
+from tusbadmh.result_class import (
+    StatusResult,
+    LengthResult,
+    CheckInputTypeResult,
+    DataResult,
+)
+
+# 文字列ならUnixドメインソケットのパス、タプルなら(host, port)のTCPアドレス
+Address = Union[str, Tuple[str, int]]
+
+# フレーム = ヘッダ(8byte) + ペイロード。すべてリトルエンディアン
+# ヘッダ: メッセージ種別(u8), ユニット番号(u8), チャンネル(u8), 要求番号(u8), ペイロード長(u32)
+# 要求番号はクライアントが要求ごとに振り、サーバは応答に同じ番号を入れて返す(データは0)
+HEADER = struct.Struct("<BBBBI")
+
+# クライアント -> サーバ
+MSG_SUBSCRIBE = 0x01  # ペイロード: 間引き率(u32)。チャンネルにCH_ALLを指定すると両チャンネルを購読する
+MSG_UNSUBSCRIBE = 0x02  # ペイロードなし
+MSG_STATUS_GET = 0x03  # ペイロードなし
+MSG_CHECK_INPUT_TYPE = 0x04  # ペイロードなし
+
+# サーバ -> クライアント
+MSG_ACK = 0x81  # ペイロード: エラーコード(u16)
+MSG_STATUS = 0x83  # ペイロード: status(u8), ovf_st(u8), エラーコード(u16)
+MSG_INPUT_TYPE = 0x84  # ペイロード: type_1(u8), type_2(u8), エラーコード(u16)
+MSG_DATA = 0x90  # ペイロード: 先頭サンプル番号(u64), バッファ使用率(u8), データ(u16の配列)
+
+# 両チャンネルを同じサンプル番号から購読する場合のチャンネル
+CH_ALL = 0xFF
+
+SUBSCRIBE = struct.Struct("<I")
+ACK = struct.Struct("<H")
+STATUS = struct.Struct("<BBH")
+INPUT_TYPE = struct.Struct("<BBH")
+DATA = struct.Struct("<QB")
+
+# 応答の種別ごとのペイロードの形式
+REPLY_FORMAT = {MSG_ACK: ACK, MSG_STATUS: STATUS, MSG_INPUT_TYPE: INPUT_TYPE}
+
+# クライアントが受信したデータを溜めておけるサンプル数(装置内バッファと同じ)
+BUFFER_SIZE = 1048576
+
+
+def _pack_samples(data: list[int]) -> bytes:
+    samples = array("H", data)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def _unpack_samples(payload: bytes) -> array:
+    samples = array("H")
+    samples.frombytes(payload)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+
+def _frame(msg_type: int, id: int, ch: int, payload: bytes = b"", seq: int = 0) -> bytes:
+    return HEADER.pack(msg_type, id, ch, seq, len(payload)) + payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < size:
+        try:
+            chunk = sock.recv(size - len(buf))
+        except OSError:
+            return None
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_frame(sock: socket.socket) -> Optional[Tuple[int, int, int, int, bytes]]:
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    msg_type, id, ch, seq, size = HEADER.unpack(header)
+    payload = _recv_exact(sock, size) if size > 0 else b""
+    if payload is None:
+        return None
+    return msg_type, id, ch, seq, payload
+
+
+def _socket_family(address: Address) -> int:
+    return socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+
+
+def _unlink_socket(path: str) -> None:
+    # 前回のサーバが残したソケットだけを消す。通常のファイルは消さない
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# バックエンドの各メソッドをサーバのロックを取ってから呼び出すラッパー
+class _LockedTUSBADMH:
+    def __init__(self, tusbadmh: TUSBADMH, lock: threading.Lock) -> None:
+        self._tusbadmh = tusbadmh
+        self._lock = lock
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._tusbadmh, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args: Any, **kwargs: Any) -> Any:
+            with self._lock:
+                return attr(*args, **kwargs)
+
+        return locked
+
+
+# 間引いた後のサンプル番号は間引き率の倍数に揃える。チャンクの区切りや購読した時点によらず、
+# 同じ間引き率ならどのチャンネルでも同じサンプル番号のデータを取り出す
+def _align(idx: int, decimation: int) -> int:
+    return -(-idx // decimation) * decimation
+
+
+class _Subscription:
+    def __init__(self, decimation: int, first: int) -> None:
+        self.decimation = decimation
+        self.first = _align(first, decimation)  # 配信する最初のサンプル番号
+        self.dropped = 0  # 送信キューが詰まって捨てたサンプル数(間引き前のサンプル数)
+
+    def decimate(self, data: list[int], start: int) -> Tuple[list[int], int]:
+        first = _align(max(start, self.first), self.decimation)
+        return data[first - start :: self.decimation], first
+
+
+class _Connection:
+    def __init__(self, server: "TUSBADMHServer", sock: socket.socket) -> None:
+        self.server = server
+        self.sock = sock
+        self.send_queue: queue.Queue[Optional[bytes]] = queue.Queue(
+            maxsize=server.queue_size
+        )
+        self.subscriptions: Dict[Tuple[int, Ch], _Subscription] = {}
+        self.closed = threading.Event()
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+
+    def start(self) -> None:
+        self.reader.start()
+        self.writer.start()
+
+    def close(self) -> None:
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        # 書き込みスレッドを終了させる。キューが満杯なら中身は捨ててよい
+        while True:
+            try:
+                self.send_queue.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self.send_queue.get_nowait()
+                except queue.Empty:
+                    pass
+        self.server._remove(self)
+
+    def publish(
+        self, id: int, ch: Ch, data: list[int], start: int, rate: int
+    ) -> None:
+        sub = self.subscriptions.get((id, ch))
+        if sub is None:
+            return
+        samples, first = sub.decimate(data, start)
+        if len(samples) == 0:
+            return
+        payload = DATA.pack(first, min(max(rate, 0), 255)) + _pack_samples(samples)
+        try:
+            self.send_queue.put_nowait(_frame(MSG_DATA, id, ch.value, payload))
+        except queue.Full:
+            # 遅いクライアントのためにサーバ全体を止めないよう、データは捨てる
+            # 欠落はクライアント側で先頭サンプル番号の飛びとして検出できる
+            sub.dropped += len(samples) * sub.decimation
+
+    def _reply(self, frame: bytes) -> None:
+        # 応答はデータと違って捨てられないので、空きが出るまで待つ
+        while not self.closed.is_set():
+            try:
+                self.send_queue.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _read_loop(self) -> None:
+        while not self.closed.is_set():
+            frame = _recv_frame(self.sock)
+            if frame is None:
+                break
+            self._handle(*frame)
+        self.close()
+
+    def _write_loop(self) -> None:
+        while True:
+            frame = self.send_queue.get()
+            if frame is None:
+                return
+            try:
+                self.sock.sendall(frame)
+            except OSError:
+                self.close()
+                return
+
+    def _handle(
+        self, msg_type: int, id: int, ch: int, seq: int, payload: bytes
+    ) -> None:
+        if msg_type == MSG_SUBSCRIBE:
+            err = self._subscribe(id, ch, payload)
+            self._reply(_frame(MSG_ACK, id, ch, ACK.pack(err.err_code), seq))
+        elif msg_type == MSG_UNSUBSCRIBE:
+            err = self._unsubscribe(id, ch)
+            self._reply(_frame(MSG_ACK, id, ch, ACK.pack(err.err_code), seq))
+        elif msg_type == MSG_STATUS_GET:
+            if id not in self.server.ids:
+                res, err = StatusResult(status=Status.STOP, ovf_st=OvfSt.OK), Error(1)
+            else:
+                with self.server.lock:
+                    res, err = self.server.tusbadmh.status_get(id)
+            payload = STATUS.pack(res.status.value, res.ovf_st.value, err.err_code)
+            self._reply(_frame(MSG_STATUS, id, ch, payload, seq))
+        elif msg_type == MSG_CHECK_INPUT_TYPE:
+            if id not in self.server.ids:
+                res_type = CheckInputTypeResult(
+                    type_1=InputType.BIPOLAR, type_2=InputType.BIPOLAR
+                )
+                err = Error(1)
+            else:
+                with self.server.lock:
+                    res_type, err = self.server.tusbadmh.check_input_type(id)
+            payload = INPUT_TYPE.pack(
+                res_type.type_1.value, res_type.type_2.value, err.err_code
+            )
+            self._reply(_frame(MSG_INPUT_TYPE, id, ch, payload, seq))
+        else:
+            self._reply(_frame(MSG_ACK, id, ch, ACK.pack(8), seq))
+
+    def _subscribe(self, id: int, ch: int, payload: bytes) -> Error:
+        if id not in self.server.ids:
+            return Error(1)
+        if ch == CH_ALL:
+            chs = list(Ch)
+        elif ch in (Ch.CHANNEL_1.value, Ch.CHANNEL_2.value):
+            chs = [Ch(ch)]
+        else:
+            return Error(8)
+        if len(payload) != SUBSCRIBE.size:
+            return Error(8)
+        (decimation,) = SUBSCRIBE.unpack(payload)
+        if decimation < 1:
+            return Error(8)
+        with self.server.clients_lock:
+            # 次に配信するサンプルから始める。両チャンネルの場合は先に進んでいる方に揃える
+            first = max(self.server.sample_idx[(id, c)] for c in chs)
+            for c in chs:
+                self.subscriptions[(id, c)] = _Subscription(decimation, first)
+        return Error(0)
+
+    def _unsubscribe(self, id: int, ch: int) -> Error:
+        if ch not in (Ch.CHANNEL_1.value, Ch.CHANNEL_2.value):
+            return Error(8)
+        with self.server.clients_lock:
+            if self.subscriptions.pop((id, Ch(ch)), None) is None:
+                return Error(7)
+        return Error(0)
+
+
+# 1つのプロセスしかdevice_openできないため、デバイスを所有するサーバが
+# 取り込んだデータをソケット経由で複数のクライアントに配信する
+# 配信中はバックエンドを直接呼ばず、ロックを取るserver.deviceを経由して操作する
+class TUSBADMHServer:
+    def __init__(
+        self,
+        tusbadmh: TUSBADMH,
+        ids: List[int],
+        address: Address,
+        poll_interval: float = 0.01,
+        queue_size: int = 256,
+    ) -> None:
+        """
+        Args:
+            tusbadmh(TUSBADMH): デバイスを操作するバックエンド。device_openや取り込み開始は呼び出し側で行う
+                start後はデータを取り出すスレッドと競合するので、server.deviceを使うこと
+            ids(list[int]): 配信するユニット番号のリスト
+            address(str | tuple[str, int]): Unixドメインソケットのパス、または(host, port)
+            poll_interval(float): デバイスからデータを取り出す間隔(秒)
+            queue_size(int): クライアントごとの送信キューのフレーム数。溢れたデータは捨てられる
+
+        """
+        self.tusbadmh = tusbadmh
+        self.ids = ids
+        self.address = address
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.lock = threading.Lock()  # バックエンドはスレッドセーフではない
+        # 配信中にadc_startやtriggerなどを呼ぶときはこちらを使う
+        self.device = cast(TUSBADMH, _LockedTUSBADMH(tusbadmh, self.lock))
+        self.clients_lock = threading.Lock()
+        self.clients: list[_Connection] = []
+        self.sample_idx: Dict[Tuple[int, Ch], int] = {
+            (id, ch): 0 for id in ids for ch in Ch
+        }
+        self.stopped = threading.Event()
+        self.listener: Optional[socket.socket] = None
+        self.threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        """
+        ソケットを開き、接続受付とデータ配信をバックグラウンドで開始します。
+        """
+        if isinstance(self.address, str):
+            _unlink_socket(self.address)
+        self.listener = socket.socket(_socket_family(self.address), socket.SOCK_STREAM)
+        if not isinstance(self.address, str):
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(self.address)
+        self.listener.listen()
+        if not isinstance(self.address, str):
+            # ポート0を指定した場合に実際のポートを参照できるようにする
+            self.address = self.listener.getsockname()[:2]
+        self.stopped.clear()
+        self.threads = [
+            threading.Thread(target=self._accept_loop, daemon=True),
+            threading.Thread(target=self._drain_loop, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            self.stopped.wait()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self.threads = []
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if isinstance(self.address, str):
+                _unlink_socket(self.address)
+        with self.clients_lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+
+    def dropped(self) -> int:
+        """
+        送信が追いつかないクライアントのために捨てたサンプル数の合計を返します(間引き前のサンプル数)。
+        """
+        with self.clients_lock:
+            return sum(
+                sub.dropped
+                for client in self.clients
+                for sub in client.subscriptions.values()
+            )
+
+    def drain(self) -> None:
+        """
+        各デバイスのPC内バッファに溜まったデータを取り出し、購読しているクライアントに配信します。
+        """
+        for id in self.ids:
+            chunks = []
+            with self.lock:
+                res, err = self.tusbadmh.length(id)
+                if err.has_error():
+                    continue
+                for ch, leng, rate in (
+                    (Ch.CHANNEL_1, res.len_1, res.rate_1),
+                    (Ch.CHANNEL_2, res.len_2, res.rate_2),
+                ):
+                    if leng <= 0:
+                        continue
+                    data_res, err = self.tusbadmh.data_get(id, ch, leng)
+                    if err.has_error() or data_res.leng <= 0:
+                        continue
+                    chunks.append((ch, data_res.data[: data_res.leng], rate))
+            for ch, data, rate in chunks:
+                self._publish(id, ch, data, rate)
+
+    def _publish(self, id: int, ch: Ch, data: list[int], rate: int) -> None:
+        with self.clients_lock:
+            start = self.sample_idx[(id, ch)]
+            self.sample_idx[(id, ch)] = start + len(data)
+            for client in self.clients:
+                client.publish(id, ch, data, start, rate)
+
+    def _remove(self, client: _Connection) -> None:
+        with self.clients_lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def _accept_loop(self) -> None:
+        listener = self.listener
+        if listener is None:
+            return
+        # close()だけではブロック中のaccept()が戻らないことがあるので定期的に停止を確認する
+        listener.settimeout(0.2)
+        while not self.stopped.is_set():
+            try:
+                sock, _ = listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            sock.settimeout(None)
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Connection(self, sock)
+            with self.clients_lock:
+                self.clients.append(client)
+            client.start()
+
+    def _drain_loop(self) -> None:
+        while not self.stopped.is_set():
+            self.drain()
+            self.stopped.wait(self.poll_interval)
+
+
+# TUSBADMHServerからデータを受け取るクライアント
+# 読み取り系のAPIのみ実装しており、既存のTUSBADMHを使うコードをそのまま動かせる
+# 設定を変更するAPIはデバイスを所有するサーバ側でしか呼べないため、エラー3を返す
+class TUSBADMHClient(TUSBADMH):
+    def __init__(
+        self,
+        address: Address,
+        decimation: int = 1,
+        timeout: float = 5.0,
+        buffer_size: int = BUFFER_SIZE,
+    ) -> None:
+        """
+        Args:
+            address(str | tuple[str, int]): サーバのUnixドメインソケットのパス、または(host, port)
+            decimation(int): device_openで購読するときの間引き率(1で間引きなし)
+            timeout(float): サーバからの応答を待つ時間(秒)
+            buffer_size(int): チャンネルごとに溜めておけるサンプル数。溢れたデータは捨てられる
+
+        """
+        self.decimation = decimation
+        self.timeout = timeout
+        self.buffer_size = buffer_size
+        self.sock = socket.socket(_socket_family(address), socket.SOCK_STREAM)
+        self.sock.connect(address)
+        if not isinstance(address, str):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffers: Dict[Tuple[int, Ch], array] = {}
+        self.rates: Dict[Tuple[int, Ch], int] = {}
+        self.decimations: Dict[Tuple[int, Ch], int] = {}
+        self.next_idx: Dict[Tuple[int, Ch], int] = {}
+        self.dropped_samples: Dict[Tuple[int, Ch], int] = {}
+        self.buffers_lock = threading.Lock()
+        self.request_lock = threading.Lock()
+        self.responses: queue.Queue[Optional[Tuple[int, int, bytes]]] = queue.Queue()
+        self.seq = 0
+        self.reader = threading.Thread(target=self._read_loop, daemon=True)
+        self.reader.start()
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.reader.join()
+
+    def subscribe(self, id: int, ch: Ch, decimation: Optional[int] = None) -> Error:
+        """
+        指定したユニット番号・チャンネルのデータの配信を要求します。
+
+        Args:
+            id(int): ユニット番号選択スイッチの番号（0-15）
+            ch(enum): チャンネル 0:ch1 1:Ch2
+            decimation(int): 間引き率。省略時はコンストラクタで指定した値
+
+        Returns:
+            Error.code(int): エラーコード
+            Error.message(str): エラーメッセージ
+
+        """
+        if decimation is None:
+            decimation = self.decimation
+        return self._subscribe(id, [ch], ch.value, decimation)
+
+    def unsubscribe(self, id: int, ch: Ch) -> Error:
+        resp = self._request(MSG_UNSUBSCRIBE, id, ch.value, MSG_ACK)
+        with self.buffers_lock:
+            self.buffers.pop((id, ch), None)
+            self.decimations.pop((id, ch), None)
+            self.next_idx.pop((id, ch), None)
+        if resp is None:
+            return Error(9)
+        return Error(resp[0])
+
+    def dropped(self, id: int, ch: Ch) -> int:
+        """
+        サーバ側で捨てられたサンプル数と、バッファが溢れて捨てたサンプル数の合計を返します(間引き前のサンプル数)。
+        """
+        with self.buffers_lock:
+            return self.dropped_samples.get((id, ch), 0)
+
+    def device_open(self, id: int) -> Error:
+        # 1回の要求で両チャンネルを購読し、Ch1とCh2のバッファを同じサンプル番号から始める
+        return self._subscribe(id, list(Ch), CH_ALL, self.decimation)
+
+    def device_close(self, id: int) -> None:
+        for ch in Ch:
+            self.unsubscribe(id, ch)
+
+    def dio_read(self, id: int, data: int) -> Error:
+        _ = id
+        _ = data
+        return Error(3)
+
+    def dio_write(self, id: int, data: int) -> Error:
+        _ = id
+        _ = data
+        return Error(3)
+
+    def adc_start(
+        self,
+        id: int,
+        cyc_len: int,
+        pre_len: int,
+        trg_sel: TrgSel,
+        mode: Mode,
+        ch1_only: bool,
+    ) -> Error:
+        _ = id
+        _ = cyc_len
+        _ = pre_len
+        _ = trg_sel
+        _ = mode
+        _ = ch1_only
+        return Error(3)
+
+    def adc_stop(self, id: int) -> Error:
+        _ = id
+        return Error(3)
+
+    def status_get(self, id: int) -> Tuple[StatusResult, Error]:
+        resp = self._request(MSG_STATUS_GET, id, 0, MSG_STATUS)
+        if resp is None:
+            return StatusResult(status=Status.STOP, ovf_st=OvfSt.OK), Error(9)
+        status, ovf_st, err_code = resp
+        return (
+            StatusResult(status=Status(status), ovf_st=OvfSt(ovf_st)),
+            Error(err_code),
+        )
+
+    def length(self, id: int) -> Tuple[LengthResult, Error]:
+        key_1 = (id, Ch.CHANNEL_1)
+        key_2 = (id, Ch.CHANNEL_2)
+        with self.buffers_lock:
+            if key_1 not in self.buffers and key_2 not in self.buffers:
+                return LengthResult(len_1=0, len_2=0, rate_1=0, rate_2=0), Error(7)
+            len_1 = len(self.buffers.get(key_1, []))
+            len_2 = len(self.buffers.get(key_2, []))
+            # 装置内バッファとこのクライアントのバッファのうち、使用率の高い方を返す
+            return (
+                LengthResult(
+                    len_1=len_1,
+                    len_2=len_2,
+                    rate_1=max(self.rates.get(key_1, 0), len_1 * 100 // self.buffer_size),
+                    rate_2=max(self.rates.get(key_2, 0), len_2 * 100 // self.buffer_size),
+                ),
+                Error(0),
+            )
+
+    def data_get(self, id: int, ch: Ch, leng: int) -> Tuple[DataResult, Error]:
+        with self.buffers_lock:
+            buf = self.buffers.get((id, ch))
+            if buf is None:
+                return DataResult(data=[], leng=0), Error(7)
+            res = buf[:leng].tolist()
+            del buf[:leng]
+        return DataResult(data=res, leng=len(res)), Error(0)
+
+    def clock_select(self, id: int, clk_sel: ClkSel, div: int, ave: int) -> Error:
+        _ = id
+        _ = clk_sel
+        _ = div
+        _ = ave
+        return Error(3)
+
+    def thlevel_set(self, id: int, th_level: int, n_level: int) -> Error:
+        _ = id
+        _ = th_level
+        _ = n_level
+        return Error(3)
+
+    def input_type(self, id: int, type_1: InputType, type_2: InputType) -> Error:
+        _ = id
+        _ = type_1
+        _ = type_2
+        return Error(3)
+
+    def check_input_type(self, id: int) -> Tuple[CheckInputTypeResult, Error]:
+        resp = self._request(MSG_CHECK_INPUT_TYPE, id, 0, MSG_INPUT_TYPE)
+        if resp is None:
+            return (
+                CheckInputTypeResult(type_1=InputType.BIPOLAR, type_2=InputType.BIPOLAR),
+                Error(9),
+            )
+        type_1, type_2, err_code = resp
+        return (
+            CheckInputTypeResult(type_1=InputType(type_1), type_2=InputType(type_2)),
+            Error(err_code),
+        )
+
+    def trigger(self, id: int) -> Error:
+        _ = id
+        return Error(3)
+
+    def translimit(self, id: int, limit: int) -> Error:
+        _ = id
+        _ = limit
+        return Error(3)
+
+    def _subscribe(self, id: int, chs: List[Ch], ch: int, decimation: int) -> Error:
+        # 以前に購読していた分のデータが混ざらないよう、バッファは空から始める
+        with self.buffers_lock:
+            for c in chs:
+                self.buffers[(id, c)] = array("H")
+                self.decimations[(id, c)] = decimation
+                self.next_idx.pop((id, c), None)
+        resp = self._request(MSG_SUBSCRIBE, id, ch, MSG_ACK, SUBSCRIBE.pack(decimation))
+        err = Error(9) if resp is None else Error(resp[0])
+        if err.has_error():
+            with self.buffers_lock:
+                for c in chs:
+                    self.buffers.pop((id, c), None)
+                    self.decimations.pop((id, c), None)
+        return err
+
+    def _request(
+        self, msg_type: int, id: int, ch: int, reply_type: int, payload: bytes = b""
+    ) -> Optional[Tuple[int, ...]]:
+        """
+        要求を送り、対応する応答のペイロードを展開して返します。
+        タイムアウトや接続断、不正な応答の場合はNoneを返します。
+        """
+        # 同時に1つの要求だけを送る。タイムアウトした要求の応答が後から届くことがあるので、
+        # 要求番号が一致しない応答は捨てる
+        with self.request_lock:
+            self.seq = (self.seq + 1) % 256
+            seq = self.seq
+            deadline = time.monotonic() + self.timeout
+            try:
+                self.sock.sendall(_frame(msg_type, id, ch, payload, seq))
+            except OSError:
+                return None
+            while True:
+                try:
+                    resp = self.responses.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    return None
+                if resp is None:
+                    # 接続が切れた。後続の要求もすぐに失敗させる
+                    self.responses.put(None)
+                    return None
+                resp_type, resp_seq, resp_payload = resp
+                if resp_seq != seq:
+                    continue
+                fmt = REPLY_FORMAT.get(resp_type)
+                if (
+                    resp_type != reply_type
+                    or fmt is None
+                    or len(resp_payload) != fmt.size
+                ):
+                    # 想定外の応答(未対応の要求へのACKなど)
+                    return None
+                return fmt.unpack(resp_payload)
+
+    def _read_loop(self) -> None:
+        while True:
+            frame = _recv_frame(self.sock)
+            if frame is None:
+                self.responses.put(None)
+                return
+            msg_type, id, ch, seq, payload = frame
+            if msg_type == MSG_DATA:
+                valid_ch = ch in (Ch.CHANNEL_1.value, Ch.CHANNEL_2.value)
+                valid_size = len(payload) >= DATA.size and (len(payload) - DATA.size) % 2 == 0
+                if valid_ch and valid_size:
+                    self._receive_data(id, Ch(ch), payload)
+            else:
+                self.responses.put((msg_type, seq, payload))
+
+    def _receive_data(self, id: int, ch: Ch, payload: bytes) -> None:
+        start, rate = DATA.unpack_from(payload)
+        data = _unpack_samples(payload[DATA.size :])
+        key = (id, ch)
+        with self.buffers_lock:
+            buf = self.buffers.get(key)
+            if buf is None:
+                # 購読解除後に届いたデータ
+                return
+            decimation = self.decimations.get(key, 1)
+            expected = self.next_idx.get(key)
+            if expected is not None and start > expected:
+                self.dropped_samples[key] = (
+                    self.dropped_samples.get(key, 0) + start - expected
+                )
+            # 欠落がなければ次のフレームの先頭サンプル番号は start + len(data) * 間引き率
+            self.next_idx[key] = start + len(data) * decimation
+            # アプリケーションが取り出さない間にメモリを使い続けないよう、溢れた分は捨てる
+            space = max(0, self.buffer_size - len(buf))
+            if len(data) > space:
+                self.dropped_samples[key] = (
+                    self.dropped_samples.get(key, 0) + (len(data) - space) * decimation
+                )
+                data = data[:space]
+            buf.extend(data)
+            self.rates[key] = rate
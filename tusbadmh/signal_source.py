@@ -0,0 +1,259 @@
+from abc import ABC, abstractmethod
+from array import array
+from functools import lru_cache
+from importlib import resources
+from typing import Iterator, Optional, Sequence
+import math
+import sys
+
+import numpy as np
+
+
+# 変換値の範囲(16bit)。バイポーラ(-1V~1V)なら32768が0V
+ADC_MIN = 0
+ADC_MAX = 65535
+ADC_CENTER = 32768
+
+
+# mock_data.binは実測した波形をリトルエンディアンのuint16で並べたもの(100000サンプル)
+# import時に読み込むと本番環境でも遅くなるので、初めて使うときに読み込む
+@lru_cache(maxsize=None)
+def get_mock_data() -> array:
+    data = array("H")
+    data.frombytes(resources.files("tusbadmh").joinpath("mock_data.bin").read_bytes())
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data
+
+
+def _to_adc(x: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(x), ADC_MIN, ADC_MAX).astype(np.uint16)
+
+
+def _time(start: int, leng: int, fs: float) -> np.ndarray:
+    return (start + np.arange(leng, dtype=np.float64)) / fs
+
+
+# TUSBADMHMockImplが返す波形の生成元
+# 出力はサンプル番号だけで決まるので、任意の位置から任意の長さを切り出せる
+class SignalSource(ABC):
+    @abstractmethod
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        """
+        start番目のサンプルからleng個のサンプルを生成します。
+
+        Args:
+            start(int): 先頭のサンプル番号
+            leng(int): 生成するサンプル数
+            fs(float): サンプリング周波数(Hz)
+
+        Returns:
+            np.ndarray: 変換値(uint16)の配列
+
+        """
+        pass
+
+    def stream(
+        self, fs: float, total: int, chunk: int = 1048576
+    ) -> Iterator[np.ndarray]:
+        """
+        total個のサンプルをchunk個ずつ生成します。全体をメモリに載せずに大量のデータを扱えます。
+
+        Args:
+            fs(float): サンプリング周波数(Hz)
+            total(int): 生成するサンプル数の合計
+            chunk(int): 1回あたりに生成するサンプル数
+
+        """
+        start = 0
+        while start < total:
+            leng = min(chunk, total - start)
+            yield self.generate(start, leng, fs)
+            start += leng
+
+
+class ReplaySource(SignalSource):
+    def __init__(self, data: Optional[Sequence[int]] = None, offset: int = 0) -> None:
+        """
+        Args:
+            data(Sequence[int]): 繰り返し再生するデータ。省略時はmock_data.binの実測波形
+            offset(int): 再生を始める位置
+
+        """
+        self.data = None if data is None else np.asarray(data, dtype=np.uint16)
+        self.offset = offset
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        _ = fs
+        if self.data is None:
+            self.data = np.frombuffer(get_mock_data(), dtype=np.uint16)
+        idx = (start + self.offset + np.arange(leng, dtype=np.int64)) % len(self.data)
+        return self.data[idx]
+
+
+class SineSource(SignalSource):
+    def __init__(
+        self,
+        freq: float,
+        amplitude: float = 16384,
+        offset: float = ADC_CENTER,
+        phase: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            freq(float): 周波数(Hz)
+            amplitude(float): 振幅(変換値単位)
+            offset(float): 中心の値(変換値単位)
+            phase(float): 初期位相(rad)
+
+        """
+        self.freq = freq
+        self.amplitude = amplitude
+        self.offset = offset
+        self.phase = phase
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        t = _time(start, leng, fs)
+        return _to_adc(
+            self.offset + self.amplitude * np.sin(2 * math.pi * self.freq * t + self.phase)
+        )
+
+
+class SquareSource(SignalSource):
+    def __init__(
+        self,
+        freq: float,
+        amplitude: float = 16384,
+        offset: float = ADC_CENTER,
+        duty: float = 0.5,
+    ) -> None:
+        """
+        Args:
+            freq(float): 周波数(Hz)
+            amplitude(float): 振幅(変換値単位)
+            offset(float): 中心の値(変換値単位)
+            duty(float): 1周期のうちHighになっている割合(0~1)
+
+        """
+        self.freq = freq
+        self.amplitude = amplitude
+        self.offset = offset
+        self.duty = duty
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        frac = np.mod(_time(start, leng, fs) * self.freq, 1.0)
+        sign = np.where(frac < self.duty, 1.0, -1.0)
+        return _to_adc(self.offset + self.amplitude * sign)
+
+
+class StepSource(SignalSource):
+    def __init__(self, at: float, low: float = ADC_CENTER, high: float = 49152) -> None:
+        """
+        Args:
+            at(float): 値が切り替わる時刻(秒)
+            low(float): 切り替わる前の値(変換値単位)
+            high(float): 切り替わった後の値(変換値単位)
+
+        """
+        self.at = at
+        self.low = low
+        self.high = high
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        t = _time(start, leng, fs)
+        return _to_adc(np.where(t < self.at, self.low, self.high))
+
+
+class ChirpSource(SignalSource):
+    def __init__(
+        self,
+        f0: float,
+        f1: float,
+        duration: float,
+        amplitude: float = 16384,
+        offset: float = ADC_CENTER,
+    ) -> None:
+        """
+        周波数がf0からf1までduration秒かけて線形に変化する波形を繰り返します。
+
+        Args:
+            f0(float): 開始周波数(Hz)
+            f1(float): 終了周波数(Hz)
+            duration(float): 1回の掃引にかける時間(秒)
+            amplitude(float): 振幅(変換値単位)
+            offset(float): 中心の値(変換値単位)
+
+        """
+        self.f0 = f0
+        self.f1 = f1
+        self.duration = duration
+        self.amplitude = amplitude
+        self.offset = offset
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        tau = np.mod(_time(start, leng, fs), self.duration)
+        k = (self.f1 - self.f0) / self.duration
+        phase = 2 * math.pi * (self.f0 * tau + k * tau**2 / 2)
+        return _to_adc(self.offset + self.amplitude * np.sin(phase))
+
+
+class NoiseSource(SignalSource):
+    # 乱数はこのサンプル数ごとに区切って生成する。区切りごとにシードを決めるので、
+    # どの位置から切り出しても同じ値になる
+    BLOCK = 4096
+
+    def __init__(self, std: float = 100, offset: float = ADC_CENTER, seed: int = 0) -> None:
+        """
+        Args:
+            std(float): 正規分布の標準偏差(変換値単位)
+            offset(float): 平均値(変換値単位)
+            seed(int): 乱数のシード
+
+        """
+        self.std = std
+        self.offset = offset
+        self.seed = seed
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        _ = fs
+        if leng <= 0:
+            return np.empty(0, dtype=np.uint16)
+        first = start // self.BLOCK
+        last = (start + leng - 1) // self.BLOCK
+        blocks = [
+            np.random.default_rng([self.seed, block]).standard_normal(self.BLOCK)
+            for block in range(first, last + 1)
+        ]
+        head = start - first * self.BLOCK
+        noise = np.concatenate(blocks)[head : head + leng]
+        return _to_adc(self.offset + self.std * noise)
+
+
+class PulseTrainSource(SignalSource):
+    def __init__(
+        self,
+        period: float,
+        width: float,
+        low: float = ADC_CENTER,
+        high: float = 49152,
+        delay: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            period(float): パルスの周期(秒)
+            width(float): パルス幅(秒)
+            low(float): パルスがないときの値(変換値単位)
+            high(float): パルスの値(変換値単位)
+            delay(float): 最初のパルスが立ち上がる時刻(秒)
+
+        """
+        self.period = period
+        self.width = width
+        self.low = low
+        self.high = high
+        self.delay = delay
+
+    def generate(self, start: int, leng: int, fs: float) -> np.ndarray:
+        t = _time(start, leng, fs) - self.delay
+        in_pulse = (t >= 0) & (np.mod(t, self.period) < self.width)
+        return _to_adc(np.where(in_pulse, self.high, self.low))
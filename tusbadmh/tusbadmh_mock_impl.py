@@ -1,8 +1,8 @@
-from typing import Tuple
-import time
-import csv
+from typing import Optional, Tuple
 import math
-import pkg_resources
+import time
+
+import numpy as np
 
 from tusbadmh.error import Error
 from tusbadmh.tusbadmh import TUSBADMH
@@ -21,38 +21,83 @@ from tusbadmh.result_class import (
     CheckInputTypeResult,
     DataResult,
 )
+from tusbadmh.signal_source import ReplaySource, SignalSource
 
-
-def __get_mock_data_from_csv() -> list[int]:
-    csv_path = pkg_resources.resource_filename("tusbadmh", "mock_data.csv")
-    f = open(csv_path, "r")
-    reader = csv.reader(f)
-    data = [e for e in reader]
-    f.close()
-    return [int(e) for e in data[0]]
-
-
-mock_data = __get_mock_data_from_csv()
+# 装置内バッファのサイズ。これを超えると取り込みを停止する
+BUFFER_SIZE = 1048576
 
 
 # NOTE: ソフトウェアトリガの場合のみを想定している
-# TODO: より柔軟なmockの実装
+# 繰り返しモードではtriggerのたびにcyc_len個のデータを生成する
+# 連続モードではtriggerの後、経過時間に応じたデータを取り出すときにまとめて生成する
 class TUSBADMHMockImpl(TUSBADMH):
-    def __init__(self) -> None:
-        self.idx_1 = 0
-        self.idx_2 = 50000
+    def __init__(
+        self,
+        source_1: Optional[SignalSource] = None,
+        source_2: Optional[SignalSource] = None,
+    ) -> None:
+        """
+        Args:
+            source_1(SignalSource): Ch1の波形。省略時はmock_data.binの実測波形
+            source_2(SignalSource): Ch2の波形。省略時はmock_data.binの実測波形を50000サンプルずらしたもの
+
+        """
+        self.source_1 = source_1 if source_1 is not None else ReplaySource(offset=0)
+        self.source_2 = source_2 if source_2 is not None else ReplaySource(offset=50000)
+        self.idx_1 = 0  # 次に生成するCh1のサンプル番号
+        self.idx_2 = 0  # 次に生成するCh2のサンプル番号
         self.cyc_len = 0
         self.pre_len = 0
         self.trg_sel = TrgSel.SOFTWARE
         self.mode = Mode.REPEAT
         self.ch1_only = True
-        self.data_1: list[int] = []
-        self.data_2: list[int] = []
+        self.data_1 = np.empty(0, dtype=np.uint16)
+        self.data_2 = np.empty(0, dtype=np.uint16)
         self.input_type_1 = InputType.BIPOLAR
         self.input_type_2 = InputType.BIPOLAR
         self.status = Status.STOP
+        self.ovf_st = OvfSt.OK
         self.clk_sel = ClkSel.IN_200MHz
         self.div = 0
+        self.ave = 0
+        self.trigger_time = 0.0
+        self.generated = 0  # trigger後に生成したサンプル数(連続モード)
+
+    def freq(self) -> float:
+        """
+        現在の設定でのサンプリング周波数(Hz)を返します。平均化するとその分だけ少なくなります。
+        """
+        return self.clk_sel.freq() / (self.div + 1) / 2**self.ave
+
+    def _generate(self, leng: int) -> None:
+        # 装置内バッファに入りきらない分は捨て、取り込みを停止する
+        space = BUFFER_SIZE - max(len(self.data_1), len(self.data_2))
+        overflow = leng > space
+        leng = min(leng, space)
+        if leng > 0:
+            fs = self.freq()
+            self.data_1 = np.concatenate(
+                (self.data_1, self.source_1.generate(self.idx_1, leng, fs))
+            )
+            self.idx_1 += leng
+            if not self.ch1_only:
+                self.data_2 = np.concatenate(
+                    (self.data_2, self.source_2.generate(self.idx_2, leng, fs))
+                )
+                self.idx_2 += leng
+        if overflow:
+            self.status = Status.STOP
+            self.ovf_st = OvfSt.OVERFLOW_CH1 if self.ch1_only else OvfSt.OVERFLOW_CH1_CH2
+
+    def _fill(self) -> None:
+        if self.mode != Mode.CONTINUATION or self.status != Status.CONVERTING:
+            return
+        target = int((time.perf_counter() - self.trigger_time) * self.freq())
+        leng = target - self.generated
+        if leng <= 0:
+            return
+        self.generated = target
+        self._generate(leng)
 
     def device_open(self, id: int) -> Error:
         _ = id
@@ -87,24 +132,27 @@ class TUSBADMHMockImpl(TUSBADMH):
         self.mode = mode
         self.ch1_only = ch1_only
         self.status = Status.WAITING
+        self.ovf_st = OvfSt.OK
         return Error(0)
 
     def adc_stop(self, id: int) -> Error:
         _ = id
+        self._fill()
         self.status = Status.STOP
         return Error(0)
 
     def status_get(self, id: int) -> Tuple[StatusResult, Error]:
         _ = id
-        return StatusResult(status=self.status, ovf_st=OvfSt.OK), Error(0)
+        self._fill()
+        return StatusResult(status=self.status, ovf_st=self.ovf_st), Error(0)
 
     def length(self, id: int) -> Tuple[LengthResult, Error]:
         _ = id
-        max = 1048576
+        self._fill()
         len_1 = len(self.data_1)
         len_2 = len(self.data_2)
-        rate_1 = int(math.floor(len_1 * 100 / max))
-        rate_2 = int(math.floor(len_2 * 100 / max))
+        rate_1 = int(math.floor(len_1 * 100 / BUFFER_SIZE))
+        rate_2 = int(math.floor(len_2 * 100 / BUFFER_SIZE))
         return (
             LengthResult(
                 len_1=len_1,
@@ -117,27 +165,20 @@ class TUSBADMHMockImpl(TUSBADMH):
 
     def data_get(self, id: int, ch: Ch, leng: int) -> Tuple[DataResult, Error]:
         _ = id
+        self._fill()
         if ch == Ch.CHANNEL_1:
-            if leng < len(self.data_1):
-                res = self.data_1[0:leng]
-                self.data_1 = self.data_1[leng:]
-            else:
-                res = self.data_1
-                self.data_1 = []
+            res = self.data_1[0:leng]
+            self.data_1 = self.data_1[leng:]
         else:
-            if leng < len(self.data_2):
-                res = self.data_2[0:leng]
-                self.data_2 = self.data_2[leng:]
-            else:
-                res = self.data_2
-                self.data_2 = []
-        return DataResult(data=res, leng=len(res)), Error(0)
+            res = self.data_2[0:leng]
+            self.data_2 = self.data_2[leng:]
+        return DataResult(data=res.tolist(), leng=len(res)), Error(0)
 
     def clock_select(self, id: int, clk_sel: ClkSel, div: int, ave: int) -> Error:
         _ = id
         self.clk_sel = clk_sel
         self.div = div
-        _ = ave
+        self.ave = ave
         return Error(0)
 
     def thlevel_set(self, id: int, th_level: int, n_level: int) -> Error:
@@ -162,15 +203,15 @@ class TUSBADMHMockImpl(TUSBADMH):
     def trigger(self, id: int) -> Error:
         _ = id
         self.status = Status.CONVERTING
-        freq = self.clk_sel.freq() / (self.div + 1)
-        dt = 1 / freq
-        for _ in range(self.cyc_len):
-            self.data_1.append(mock_data[self.idx_1])
-            self.idx_1 = self.idx_1 + 1 if self.idx_1 < len(mock_data) - 1 else 0
-            if not self.ch1_only:
-                self.data_2.append(mock_data[self.idx_2])
-                self.idx_2 = self.idx_2 + 1 if self.idx_2 < len(mock_data) - 1 else 0
-            time.sleep(dt)
+        if self.mode == Mode.CONTINUATION:
+            self.trigger_time = time.perf_counter()
+            self.generated = 0
+            return Error(0)
+        # 実機と同じくcyc_len個の取り込みにかかる時間だけ待ち、次のトリガ待ちに戻る
+        self._generate(self.cyc_len)
+        time.sleep(self.cyc_len / self.freq())
+        if self.status == Status.CONVERTING:
+            self.status = Status.WAITING
         return Error(0)
 
     def translimit(self, id: int, limit: int) -> Error:
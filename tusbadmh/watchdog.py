@@ -0,0 +1,240 @@
+from typing import Callable, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from tusbadmh.error import Error
+from tusbadmh.tusbadmh import TUSBADMH
+from tusbadmh.enum import (
+    Ch,
+    Mode,
+    OvfSt,
+    Status,
+    TrgSel,
+)
+
+logger = logging.getLogger(__name__)
+
+# (装置内バッファ使用率のしきい値(%), 1回に取り出す最大サンプル数, ポーリング間隔(秒))
+# 使用率がしきい値以上になったら、その段階の設定で取り出す
+DEFAULT_LEVELS: List[Tuple[int, int, float]] = [
+    (0, 65536, 0.01),
+    (25, 262144, 0.005),
+    (50, 1048576, 0.001),
+    (75, 1048576, 0.0),
+]
+
+
+# 装置内バッファが100%になると取り込みが止まってしまうので、使用率に応じて取り出しを速め、
+# それでもオーバーフローした場合は欠落したサンプル数を記録して取り込みを再開する
+# 欠落したサンプル数はソフトウェアトリガの連続モードでのみ計算する。繰り返しモードではトリガ待ちや
+# サイクル間の待ち時間と区別できず、それ以外のトリガでは再開後に変換が始まる時刻が分からないので、
+# 再開はするが欠落数は記録しない
+class OverflowWatchdog:
+    def __init__(
+        self,
+        tusbadmh: TUSBADMH,
+        id: int,
+        fs: float,
+        cyc_len: int,
+        pre_len: int,
+        trg_sel: TrgSel,
+        mode: Mode,
+        ch1_only: bool,
+        levels: Optional[List[Tuple[int, int, float]]] = None,
+    ) -> None:
+        """
+        Args:
+            tusbadmh(TUSBADMH): バックエンド。device_openやクロックなどの設定は呼び出し側で行う
+            id(int): ユニット番号選択スイッチの番号（0-15）
+            fs(float): サンプリング周波数(Hz)。欠落したサンプル数の計算に使う
+            cyc_len, pre_len, trg_sel, mode, ch1_only: adc_startに渡す引数
+            levels(list[tuple[int, int, float]]): 使用率ごとの取り出し設定。省略時はDEFAULT_LEVELS
+                最も低いしきい値は0である必要がある
+
+        """
+        self.tusbadmh = tusbadmh
+        self.id = id
+        self.fs = fs
+        self.cyc_len = cyc_len
+        self.pre_len = pre_len
+        self.trg_sel = trg_sel
+        self.mode = mode
+        self.ch1_only = ch1_only
+        self.levels = sorted(levels if levels is not None else DEFAULT_LEVELS)
+        if len(self.levels) == 0 or self.levels[0][0] != 0:
+            raise Exception(f"the lowest level must start at 0%: {self.levels}")
+        self.level = self.levels[0]
+        self.rate = 0  # 直近の装置内バッファ使用率(%)
+        self.start_time: Optional[float] = None  # ソフトウェアトリガをかけた時刻
+        self.received = 0  # 今回の取り込み開始後に受け取ったCh1のサンプル数(プレトリガ分を含む)
+        # オーバーフローのたびに欠落したサンプル数(ソフトウェアトリガの連続モードのみ)
+        self.gaps: List[int] = []
+        self.restarts = 0
+
+    @property
+    def chunk(self) -> int:
+        return self.level[1]
+
+    @property
+    def interval(self) -> float:
+        return self.level[2]
+
+    @property
+    def dropped(self) -> int:
+        """
+        オーバーフローで欠落したサンプル数の合計を返します。欠落数を計算できない場合の分は含みません。
+        """
+        return sum(self.gaps)
+
+    def start(self) -> Error:
+        """
+        取り込みを開始します。ソフトウェアトリガの場合はトリガもかけます。
+        """
+        err = self.tusbadmh.adc_start(
+            id=self.id,
+            cyc_len=self.cyc_len,
+            pre_len=self.pre_len,
+            trg_sel=self.trg_sel,
+            mode=self.mode,
+            ch1_only=self.ch1_only,
+        )
+        if err.has_error():
+            return err
+        self.start_time = None
+        self.received = 0
+        if self.trg_sel == TrgSel.SOFTWARE:
+            trigger_time = time.perf_counter()
+            err = self.tusbadmh.trigger(id=self.id)
+            if err.has_error():
+                return err
+            self.start_time = trigger_time
+        return Error(0)
+
+    def stop(self) -> Error:
+        return self.tusbadmh.adc_stop(id=self.id)
+
+    def poll(self) -> Tuple[List[int], List[int], Error]:
+        """
+        PC内のバッファからデータを取り出し、オーバーフローしていれば取り込みを再開します。
+
+        Returns:
+            list[int]: Ch1 の取得データ
+            list[int]: Ch2 の取得データ(ch1_onlyの場合は空)
+            Error.code(int): エラーコード
+            Error.message(str): エラーメッセージ
+
+        """
+        res, err = self.tusbadmh.length(id=self.id)
+        if err.has_error():
+            return [], [], err
+        self.rate = max(res.rate_1, res.rate_2)
+        self.level = [level for level in self.levels if level[0] <= self.rate][-1]
+        data_1, err = self._read(Ch.CHANNEL_1, res.len_1)
+        if err.has_error():
+            return data_1, [], err
+        data_2, err = self._read(Ch.CHANNEL_2, res.len_2)
+        if err.has_error():
+            return data_1, data_2, err
+
+        status, err = self.tusbadmh.status_get(id=self.id)
+        if err.has_error():
+            return data_1, data_2, err
+        if status.ovf_st == OvfSt.OK:
+            return data_1, data_2, Error(0)
+
+        # 取り込みは止まっているが、PC内のバッファに残っているデータはまだ有効
+        res, err = self.tusbadmh.length(id=self.id)
+        if err.has_error():
+            return data_1, data_2, err
+        rest_1, err = self._read(Ch.CHANNEL_1, res.len_1, chunk=res.len_1)
+        if err.has_error():
+            return data_1, data_2, err
+        rest_2, err = self._read(Ch.CHANNEL_2, res.len_2, chunk=res.len_2)
+        if err.has_error():
+            return data_1 + rest_1, data_2, err
+        err = self._restart(status.ovf_st, status.status)
+        return data_1 + rest_1, data_2 + rest_2, err
+
+    def run(
+        self,
+        callback: Callable[[List[int], List[int]], None],
+        stop_event: threading.Event,
+    ) -> Error:
+        """
+        stop_eventがセットされるまでpollを繰り返し、取り出したデータをcallbackに渡します。
+        """
+        err = self.start()
+        if err.has_error():
+            return err
+        while not stop_event.is_set():
+            data_1, data_2, err = self.poll()
+            if err.has_error():
+                self.stop()
+                return err
+            if len(data_1) > 0 or len(data_2) > 0:
+                callback(data_1, data_2)
+            if self.interval > 0:
+                stop_event.wait(self.interval)
+        return self.stop()
+
+    def _read(
+        self, ch: Ch, leng: int, chunk: Optional[int] = None
+    ) -> Tuple[List[int], Error]:
+        leng = min(leng, self.chunk if chunk is None else chunk)
+        if leng <= 0 or (ch == Ch.CHANNEL_2 and self.ch1_only):
+            return [], Error(0)
+        res, err = self.tusbadmh.data_get(id=self.id, ch=ch, leng=leng)
+        if err.has_error():
+            return [], err
+        if ch == Ch.CHANNEL_1:
+            self.received += res.leng
+        return res.data[: res.leng], Error(0)
+
+    def _restart(self, ovf_st: OvfSt, status: Status) -> Error:
+        self.restarts += 1
+        start_time, received = self.start_time, self.received
+        err = self.stop()
+        if err.has_error():
+            return err
+        err = self.start()
+        if err.has_error():
+            return err
+        if (
+            self.mode != Mode.CONTINUATION
+            or start_time is None
+            or self.start_time is None
+        ):
+            logger.warning(
+                "buffer overflow on unit %d (%s, status: %s): lost samples unknown "
+                "with %s trigger in %s mode after %d received, restarted",
+                self.id,
+                ovf_st.name,
+                status.name,
+                self.trg_sel.name,
+                self.mode.name,
+                received,
+            )
+            return Error(0)
+        # 前回トリガしてから再開してトリガするまでにサンプリングされたはずの数と、実際に受け取った数の差が
+        # 欠落分。adc_stop/adc_start/triggerの間に失われた分も含む。受け取った数にはプレトリガ分が含まれる
+        expected = round((self.start_time - start_time) * self.fs)
+        gap = expected - (received - self.pre_len)
+        if gap < 0:
+            logger.warning(
+                "unit %d received %d samples more than expected; check fs and pre_len",
+                self.id,
+                -gap,
+            )
+            gap = 0
+        self.gaps.append(gap)
+        logger.warning(
+            "buffer overflow on unit %d (%s, status: %s): lost %d samples "
+            "after %d received, restarted",
+            self.id,
+            ovf_st.name,
+            status.name,
+            gap,
+            received,
+        )
+        return Error(0)